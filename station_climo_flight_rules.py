@@ -1,8 +1,44 @@
-import requests
+import asyncio
+import calendar
+from concurrent.futures import ProcessPoolExecutor
+import gzip
+from io import BytesIO
+from pathlib import Path
+
+import aiohttp
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from pandas.api.types import union_categoricals
 import matplotlib.pyplot as plt
 
-def fetch_data(station_code, start_date, end_date):
+try:
+    from numba import njit, prange, set_num_threads
+except ImportError:  # Numba is optional, without it the vectorized pandas functions are used
+    njit = None
+
+# Sky cover codes reported by the ASOS archive, read as a fixed set of categories so that they can be compared by code
+SKY_COVER_DTYPE = pd.CategoricalDtype(["CLR", "SKC", "NSC", "NCD", "FEW", "SCT", "BKN", "OVC", "VV"])
+
+# Category codes of the sky cover that constitutes a ceiling
+CEILING_CODES = SKY_COVER_DTYPE.categories.get_indexer(["BKN", "OVC", "VV"])
+
+# Aviation flight rule categories, from the best to the worst conditions
+FLIGHT_RULE_DTYPE = pd.CategoricalDtype(["VFR", "MVFR", "IFR", "LIFR"])
+
+
+async def fetch_data(session, semaphore, station_code, start_date, end_date, max_attempts=4, cache_dir='cache'):
+    # At least one request has to be made to fetch the data
+    if max_attempts < 1:
+        raise ValueError(f"max_attempts must be at least 1, got {max_attempts}")
+
+    # Load the data from the cache if this station and period have been fetched before
+    cache_path = Path(cache_dir) / f"{station_code}_{start_date:%Y%m%d}_{end_date:%Y%m%d}.csv.gz"
+    if cache_path.exists():
+        # Decompress in a worker thread so that the other downloads are not stalled
+        return await asyncio.to_thread(load_from_cache, cache_path)
+
     url = "https://mesonet.agron.iastate.edu/cgi-bin/request/asos.py"
     
     params = {
@@ -27,25 +63,77 @@ def fetch_data(station_code, start_date, end_date):
         "report_type": [3, 4]
     }
 
-    response = requests.get(url, params=params)
-    
-    # Check if the request was successful
-    if response.status_code == 200:
-        return response.text
-    else:
-        raise Exception(f"Failed to fetch data for station {station_code}. Status code: {response.status_code}")
+    # aiohttp does not expand list values, so repeat the key for each list item
+    query = [(key, str(item)) for key, value in params.items()
+             for item in (value if isinstance(value, list) else [value])]
+
+    # Limit the number of concurrent requests to the server
+    async with semaphore:
+        for attempt in range(max_attempts):
+            # Keep the outcome of the last attempt for the error message
+            status = None
+            error = None
+            try:
+                async with session.get(url, params=query) as response:
+                    # Check if the request was successful
+                    if response.status == 200:
+                        csv_data = await response.read()
+                        # Compress in a worker thread so that the other downloads are not stalled
+                        await asyncio.to_thread(save_to_cache, csv_data, cache_path)
+                        return csv_data
+                    status = response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Retry connection errors and timeouts just like unsuccessful responses
+                error = e
+
+            # Back off exponentially before retrying
+            if attempt < max_attempts - 1:
+                await asyncio.sleep(2 ** attempt)
+
+    message = f"Failed to fetch data for station {station_code} after {max_attempts} attempts."
+    if error is not None:
+        raise Exception(f"{message} Last error: {type(error).__name__}: {error}") from error
+    raise Exception(f"{message} Status code: {status}")
+
+
+def load_from_cache(cache_path):
+    with gzip.open(cache_path, 'rb') as cache_file:
+        return cache_file.read()
+
+
+def save_to_cache(csv_data, cache_path):
+    # Write to a temporary file first so that an interrupted run never leaves a truncated cache entry
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+    # A low compression level is much faster and still shrinks the CSV text several times over
+    with gzip.open(tmp_path, 'wb', compresslevel=1) as cache_file:
+        cache_file.write(csv_data)
+    tmp_path.replace(cache_path)
+
+
+async def fetch_all_data(station_codes, start_date, end_date, max_concurrency=8):
+    # Don't limit the total download time, so that slow multi-year downloads are not cut off while still
+    # progressing, but give up on connections that cannot be opened or stop sending data
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=300)
+
+    # Fetch the data for all stations concurrently over a shared session
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        semaphore = asyncio.Semaphore(max_concurrency)
+        return await asyncio.gather(
+            *[fetch_data(session, semaphore, station_code, start_date, end_date) for station_code in station_codes],
+            return_exceptions=True)
 
 
 def parse_csv_to_dataframe(csv_data):
-    # Use StringIO to convert the CSV string into a file-like object
-    from io import StringIO
-    csv_file = StringIO(csv_data)
+    # Use BytesIO to let the multithreaded Arrow parser read the raw response bytes directly
+    csv_file = BytesIO(csv_data)
     
-    # Load the CSV data into a Pandas DataFrame
-    df = pd.read_csv(csv_file)
-
-    # Replace "M" with NaN in the 'vsby' column
-    df['vsby'] = df['vsby'].replace('M', pd.NA)
+    # Load the columns used downstream into a Pandas DataFrame, reading "M" as NaN and the sky cover codes as categories
+    df = pd.read_csv(
+        csv_file, engine='pyarrow', na_values=['M'], parse_dates=['valid'],
+        usecols=['valid', 'vsby', 'skyc1', 'skyc2', 'skyc3', 'skyl1', 'skyl2', 'skyl3'],
+        dtype={'vsby': 'float64', 'skyl1': 'float64', 'skyl2': 'float64', 'skyl3': 'float64',
+               'skyc1': 'category', 'skyc2': 'category', 'skyc3': 'category'})
      
     #Ensure that observation time column is in datetime format
     df.index = pd.to_datetime(df['valid'])
@@ -59,198 +147,245 @@ def parse_csv_to_dataframe(csv_data):
     return df
 
 def save_to_csv(df, station_code, file_suffix=''):
-    # Save the DataFrame to a CSV file
-    df.to_csv(f"csv/{station_code}_data{file_suffix}.csv", index=False)
+    # Save the DataFrame to a CSV file with Arrow's columnar CSV writer
+    pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), f"csv/{station_code}_data{file_suffix}.csv")
     
 
 def find_ceiling(df):
-    # Define the columns to check for "BKN" or "OVC"
+    # Define the columns to check for "BKN", "OVC" or "VV"
     skyc_columns = ["skyc1", "skyc2", "skyc3"]
     skyl_columns = ["skyl1", "skyl2", "skyl3"]
 
-    for index, row in df.iterrows():
-        ceiling_found = False
-        for i, skyc_column in enumerate(skyc_columns):
-            if row[skyc_column] == "BKN" or row[skyc_column] == "OVC" or row[skyc_column] == "VV":
-                # Convert the value to numeric before assignment
-                df.at[index, 'ceiling'] = pd.to_numeric(row[skyl_columns[i]], errors='coerce')
-                ceiling_found = True
-                break  # Stop searching for "BKN" or "OVC" in other columns
+    # Pre-allocate the ceiling with the default value of 99999, used if no ceiling is found
+    ceiling = np.full(len(df), 99999, dtype=np.int32)
+
+    # Track the rows whose lowest ceiling layer has already been found
+    found = np.zeros(len(df), dtype=bool)
 
-        if not ceiling_found:
-            # If no ceiling is found, set the default value to 99999
-            df.at[index, 'ceiling'] = 99999
+    for skyc_column, skyl_column in zip(skyc_columns, skyl_columns):
+        # Flag the layers that constitute a ceiling by comparing the integer category codes
+        is_ceiling = np.isin(df[skyc_column].cat.codes.to_numpy(), CEILING_CODES) & ~found
 
-    # Ensure 'ceiling' column has an integer data type
-    df['ceiling'] = pd.to_numeric(df['ceiling'], errors='coerce').fillna(99999).astype(int)
+        # A ceiling layer without a reported height keeps the default value of 99999
+        heights = df[skyl_column].to_numpy(dtype=np.float64, na_value=np.nan)
+        has_height = is_ceiling & ~np.isnan(heights)
+        ceiling[has_height] = heights[has_height]
+
+        # Stop searching for a ceiling in the higher layers
+        found |= is_ceiling
+
+    df['ceiling'] = ceiling
 
     return df
 
 def calculate_flight_rules(df):
-    # Convert 'ceiling' and 'vsby' columns to numeric
-    df['ceiling'] = pd.to_numeric(df['ceiling'], errors='coerce')
-    df['vsby'] = pd.to_numeric(df['vsby'], errors='coerce')
-
-    # Create new columns for aviation flight rule categories
-    df['VFR'] = (df['ceiling'] >= 2000) & (df['vsby'] >= 3)
-    df['MVFR'] = (
-        ((df['ceiling'] >= 1000) & (df['ceiling'] < 2000) & (df['vsby'] >= 2) & (df['vsby'] < 3)) |
-        ((df['ceiling'] >= 1000) & (df['ceiling'] < 2000) & (df['vsby'] >= 2)) |
-        ((df['ceiling'] >= 2000) & (df['vsby'] >= 2) & (df['vsby'] < 3)))
-    df['IFR'] = (
-        ((df['ceiling'] >= 400) & (df['ceiling'] < 1000) & (df['vsby'] >= 1) & (df['vsby'] < 2)) |
-        ((df['ceiling'] >= 400) & (df['ceiling'] < 1000) & (df['vsby'] >= 1)) |
-        ((df['ceiling'] >= 1000) & (df['vsby'] >= 1) & (df['vsby'] < 2)))
-    df['LIFR'] = (df['ceiling'] < 400) | (df['vsby'] < 1)
+    # Extract the (already numeric) 'ceiling' and 'vsby' columns once as numpy arrays
+    ceiling = df['ceiling'].to_numpy(dtype=np.float64)
+    vsby = df['vsby'].to_numpy(dtype=np.float64, na_value=np.nan)
+
+    # Compute the aviation flight rule categories, each one applying below the one before it
+    vfr = (ceiling >= 2000) & (vsby >= 3)
+    mvfr = (ceiling >= 1000) & (vsby >= 2) & ~vfr
+    ifr = (ceiling >= 400) & (vsby >= 1) & ~(vfr | mvfr)
+    lifr = (ceiling < 400) | (vsby < 1)
+
+    # Create a single categorical column for the aviation flight rule category, left missing if it cannot be determined
+    df['rule'] = pd.Categorical.from_codes(
+        np.select([vfr, mvfr, ifr, lifr], [0, 1, 2, 3], default=-1), dtype=FLIGHT_RULE_DTYPE)
 
     return df
 
-def plot_flight_category_occurrences(combined_df, category_name):
-    # Sum the "length_obs" column for each station and flight category
-    category_counts = combined_df.groupby(['Station', category_name])['length_obs'].sum().unstack()
+if njit is not None:
+    @njit(cache=True, parallel=True)
+    def flight_rules_kernel(skyc_codes, skyl, vsby, ceiling_codes, out_ceiling, out_rule):
+        # Classify each observation independently, in parallel over the rows
+        for i in prange(skyl.shape[0]):
+            # Find the lowest layer that constitutes a ceiling, defaulting to 99999 if there is none
+            ceiling = 99999
+            for layer in range(skyc_codes.shape[1]):
+                is_ceiling = False
+                for code in ceiling_codes:
+                    if skyc_codes[i, layer] == code:
+                        is_ceiling = True
+                if is_ceiling:
+                    # A ceiling layer without a reported height also falls back to 99999
+                    if not np.isnan(skyl[i, layer]):
+                        ceiling = int(skyl[i, layer])
+                    break
+            out_ceiling[i] = ceiling
+
+            # Encode the flight rule category as 0=VFR, 1=MVFR, 2=IFR, 3=LIFR, or -1 if it cannot be determined
+            if ceiling < 400 or vsby[i] < 1:
+                out_rule[i] = 3
+            elif np.isnan(vsby[i]):
+                out_rule[i] = -1
+            elif ceiling >= 2000 and vsby[i] >= 3:
+                out_rule[i] = 0
+            elif ceiling >= 1000 and vsby[i] >= 2:
+                out_rule[i] = 1
+            else:
+                out_rule[i] = 2
+
+def classify_observations(df):
+    # Map the sky cover codes onto the fixed categories, turning any unlisted code into NaN
+    for skyc_column in ["skyc1", "skyc2", "skyc3"]:
+        df[skyc_column] = df[skyc_column].cat.set_categories(SKY_COVER_DTYPE.categories)
+
+    # Without Numba, find the ceiling and flight rules with the vectorized pandas functions
+    if njit is None:
+        return calculate_flight_rules(find_ceiling(df))
+
+    # Pass plain numpy arrays to the kernel
+    skyc_codes = np.column_stack([df[skyc_column].cat.codes.to_numpy() for skyc_column in ["skyc1", "skyc2", "skyc3"]])
+    skyl = df[["skyl1", "skyl2", "skyl3"]].to_numpy(dtype=np.float32, na_value=np.nan)
+    vsby = df['vsby'].to_numpy(dtype=np.float64, na_value=np.nan)
+
+    # Find the ceiling and flight rule category of every observation in a single pass
+    ceiling = np.empty(len(df), dtype=np.int32)
+    rule = np.empty(len(df), dtype=np.int8)
+    flight_rules_kernel(skyc_codes, skyl, vsby, CEILING_CODES, ceiling, rule)
+
+    # Create the same columns as find_ceiling and calculate_flight_rules
+    df['ceiling'] = ceiling
+    df['rule'] = pd.Categorical.from_codes(rule, dtype=FLIGHT_RULE_DTYPE)
 
-    # Sum the "length_obs" column to get the total number of hours for each station
-    total_hours = combined_df.groupby('Station')['length_obs'].sum()
+    return df
 
+def plot_flight_category_occurrences(category_counts, total_hours, category_name, climatology_period, ax):
     # Calculate the average number of hours per year for each station
-    avg_hours_per_year = (category_counts[True] / total_hours) * 365.25 * 24
-
-    # Plot a bar chart with larger size and higher DPI
-    plt.figure(figsize=(16, 8), dpi=200)
+    avg_hours_per_year = (category_counts[category_name] / total_hours) * 365.25 * 24
 
     # Set a colormap based on the count values
-    colors = plt.cm.viridis(category_counts[True] / category_counts[True].max())
+    colors = plt.cm.viridis(category_counts[category_name] / category_counts[category_name].max())
 
     # Ensure that both arrays have the same shape
     x_values = category_counts.index
-    y_values = avg_hours_per_year[category_counts[True].index]
-
-    plt.bar(x_values, y_values, color=colors)
-    plt.xlabel('Station', fontsize=14)  # Increase font size
-    plt.ylabel(f'Average {category_name} Hours per Year', fontsize=14)  # Increase font size
-    plt.title(f'Average {category_name} Hours per Year for Each Station', fontsize=16)  # Increase font size
-    climatology_period = f'{combined_df["valid"].dt.year.min()} - {combined_df["valid"].dt.year.max()}'
-    plt.suptitle(f'{category_name} - Climatology Period: {climatology_period}', fontsize=24)
+    y_values = avg_hours_per_year[category_counts[category_name].index]
+
+    # Plot a bar chart on the shared axes, clearing the previous category first
+    ax.clear()
+    ax.bar(x_values, y_values, color=colors)
+    ax.set_xlabel('Station', fontsize=14)  # Increase font size
+    ax.set_ylabel(f'Average {category_name} Hours per Year', fontsize=14)  # Increase font size
+    ax.set_title(f'Average {category_name} Hours per Year for Each Station', fontsize=16)  # Increase font size
+    ax.figure.suptitle(f'{category_name} - Climatology Period: {climatology_period}', fontsize=24)
     # Rotate station name labels to prevent overlapping
-    plt.xticks(rotation=45, ha='right', fontsize=12)  # Increase font size
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right', fontsize=12)  # Increase font size
 
     # Save the plot to a .png file
-    plt.savefig(f'images/average_{category_name}_hours_per_year.png', bbox_inches='tight')  # Adjust layout to include labels
-    plt.close()
+    ax.figure.savefig(f'images/average_{category_name}_hours_per_year.png', bbox_inches='tight')  # Adjust layout to include labels
 
-def plot_subvfr_frequency_by_hour(combined_df):
-    # Filter rows based on the sub-VFR category
-    subvfr_df = combined_df[~combined_df['VFR']]
+def plot_frequency_by_hour(combined_df, category_mask, category_label, file_label):
+    # Group the observations by station, month and hour of the day
+    group_keys = [combined_df['Station'], combined_df['month'], combined_df['hour']]
+
+    # Sum the "length_obs" column of the observations in the category and of all observations
+    category_hours = combined_df['length_obs'].where(category_mask, 0).groupby(group_keys).sum()
+    total_hours = combined_df['length_obs'].groupby(group_keys).sum()
 
-    # Convert the 'valid' column to datetime (if not already)
-    subvfr_df['valid'] = pd.to_datetime(subvfr_df['valid'], errors='coerce')
+    # Calculate the percentage of hours in the category, with one column per hour of the day
+    percentages = (category_hours / total_hours * 100).unstack('hour').reindex(columns=range(24)).fillna(0)
 
-    # Extract hour of the day from the 'valid' column
-    subvfr_df['hour'] = subvfr_df['valid'].dt.hour
+    # Find the months in which the category occurred at each station
+    category_months = category_mask.groupby(group_keys[:2]).any()
 
     # Use a single color for all bars
     bar_color = 'tab:blue'
 
-    # Create a separate figure for each station
-    for station in subvfr_df['Station'].unique():
-        station_df = subvfr_df[subvfr_df['Station'] == station]
+    climatology_period = f'{combined_df["valid"].dt.year.min()} - {combined_df["valid"].dt.year.max()}'
+
+    # Create subplots for each month, reused for every station
+    fig, axes = plt.subplots(3, 4, figsize=(20, 12), dpi=100, sharex=True, sharey=True)
 
-        # Create subplots for each month
-        fig, axes = plt.subplots(3, 4, figsize=(20, 12), dpi=100, sharex=True, sharey=True)
-        fig.suptitle(f'Sub-VFR Frequency by Hour - {station}', fontsize=24)
+    # Create a separate plot for each station
+    for station in combined_df.loc[category_mask, 'Station'].unique():
+        # Clear the previous station from the subplots
+        for ax in axes.flat:
+            ax.clear()
 
-        max_percentage = 0  # Initialize max_percentage to 0
-        climatology_period = f'{combined_df["valid"].dt.year.min()} - {combined_df["valid"].dt.year.max()}'
-        fig.suptitle(f'Sub-VFR Frequency by Hour - {station} - Climatology Period: {climatology_period}', fontsize=24)
+        fig.suptitle(f'{category_label} Frequency by Hour - {station} - Climatology Period: {climatology_period}', fontsize=24)
 
         for month, ax in zip(range(1, 13), axes.flatten()):
-            month_df = station_df[station_df['valid'].dt.month == month]
-            if not month_df.empty:  # Check if the dataframe is not empty
-
-                for hour in range(24):
-                    # Calculate total number of observations for each month and hour
-                    station_hour_month_df = combined_df[
-                        (combined_df['Station'] == station) &
-                        (combined_df['hour'] == hour) &
-                        (combined_df['valid'].dt.month == month)
-                    ]
-
-                    total_hours = station_hour_month_df['length_obs'].sum()
-
-                    # Plot sub-VFR frequency by hour for each station
-                    hour_df = month_df[month_df['hour'] == hour]
-                    percentage_data = (hour_df['length_obs'].sum() / total_hours) * 100
-                    ax.bar([hour], [percentage_data], color=bar_color, alpha=0.7, align='center', width=0.8)
-                    ax.set_title(month_df['valid'].dt.strftime('%B').iloc[0])  # Use month names
-                    ax.set_xlabel('Hour of Day (UTC)', fontsize=12)
-                    ax.set_ylabel('%', fontsize=12)
-                    ax.set_xticks(range(24))
-                    ax.set_xticklabels([str(hour) for hour in range(24)], rotation=90, ha='center')  # Rotate x-axis labels
-
-        plt.tight_layout(rect=[0, 0.03, 1, 0.95])
-
-        plt.savefig(f'images/subvfr_frequency_by_hour_{station}.png', bbox_inches='tight')
-        plt.close()
+            if category_months.get((station, month), False):  # Check if the category occurred in this month
+                # Plot the category frequency by hour for this station and month
+                ax.bar(range(24), percentages.loc[(station, month)].to_numpy(), color=bar_color, alpha=0.7, align='center', width=0.8)
+                ax.set_title(calendar.month_name[month])  # Use month names
+                ax.set_xlabel('Hour of Day (UTC)', fontsize=12)
+                ax.set_ylabel('%', fontsize=12)
+                ax.set_xticks(range(24))
+                ax.set_xticklabels([str(hour) for hour in range(24)], rotation=90, ha='center')  # Rotate x-axis labels
+
+        fig.tight_layout(rect=[0, 0.03, 1, 0.95])
+
+        fig.savefig(f'images/{file_label}_frequency_by_hour_{station}.png', bbox_inches='tight')
+
+    plt.close(fig)
+
+def plot_subvfr_frequency_by_hour(combined_df):
+    # Plot the frequency of all observations that are not VFR
+    plot_frequency_by_hour(combined_df, combined_df['rule'] != 'VFR', 'Sub-VFR', 'subvfr')
 
 def plot_flight_category_frequency_by_hour(combined_df, flight_category):
-    # Filter rows based on the specified flight category
-    category_df = combined_df[combined_df[flight_category]]
+    # Plot the frequency of observations in the specified flight category
+    plot_frequency_by_hour(combined_df, combined_df['rule'] == flight_category, flight_category, flight_category.lower())
 
-    # Convert the 'valid' column to datetime (if not already)
-    category_df['valid'] = pd.to_datetime(category_df['valid'], errors='coerce')
 
-    # Extract hour of the day from the 'valid' column
-    category_df['hour'] = category_df['valid'].dt.hour
+def init_station_worker():
+    # Each worker process handles a whole station, so keep Numba and Arrow to one thread per process
+    # to avoid starting a thread per core in every worker and oversubscribing the cores
+    pa.set_cpu_count(1)
+    if njit is not None:
+        set_num_threads(1)
 
-    # Use a single color for all bars
-    bar_color = 'tab:blue'
+def process_station(station_code, csv_data):
+    # Parse CSV data into a Pandas DataFrame
+    df = parse_csv_to_dataframe(csv_data)
 
-    # Create a separate figure for each station
-    for station in category_df['Station'].unique():
-        station_df = category_df[category_df['Station'] == station]
+    # Save the raw data to a CSV file before any columns are added
+    save_to_csv(df, station_code + '_raw')
 
-        # Create subplots for each month
-        fig, axes = plt.subplots(3, 4, figsize=(20, 12), dpi=100, sharex=True, sharey=True)
-        fig.suptitle(f'{flight_category} Frequency by Hour - {station}', fontsize=24)
+    # Extract the month and hour of the day from the observation time once, for the plots
+    df['month'] = df['valid'].dt.month.astype(np.int8)
+    df['hour'] = df['valid'].dt.hour.astype(np.int8)
 
-        max_percentage = 0  # Initialize max_percentage to 0
-        climatology_period = f'{combined_df["valid"].dt.year.min()} - {combined_df["valid"].dt.year.max()}'
-        fig.suptitle(f'{flight_category} Frequency by Hour - {station} - Climatology Period: {climatology_period}', fontsize=24)
-        for month, ax in zip(range(1, 13), axes.flatten()):
-            month_df = station_df[station_df['month'] == month]
-            if not month_df.empty:  # Check if the dataframe is not empty
-                for hour in range(24):
-                    # Calculate total number of observations for each month and hour
-                    station_hour_month_df = combined_df[
-                    (combined_df['Station'] == station) &
-                    (combined_df['hour'] == hour) &
-                    (combined_df['valid'].dt.month == month)
-                    ]
-                    total_hours = station_hour_month_df['length_obs'].sum()
-                    # Plot flight category frequency by hour for each station
-                    hour_df = month_df[month_df['hour'] == hour]
-                    percentage_data = ((hour_df[flight_category] * hour_df['length_obs']).sum() / total_hours) * 100
-                    ax.bar([hour], [percentage_data], color=bar_color, alpha=0.7, align='center', width=0.8)
-                    ax.set_title(month_df['valid'].dt.strftime('%B').iloc[0])  # Use month names
-                    ax.set_xlabel('Hour of Day (UTC)', fontsize=12)
-                    ax.set_ylabel('%', fontsize=12)
-                    ax.set_xticks(range(24))
-                    ax.set_xticklabels([str(hour) for hour in range(24)], rotation=90, ha='center')  # Rotate x-axis labels
-
-
-        plt.tight_layout(rect=[0, 0.03, 1, 0.95])
-
-        plt.savefig(f'images/{flight_category.lower()}_frequency_by_hour_{station}.png', bbox_inches='tight')
-        plt.close()
+    # Find the ceiling and calculate aviation flight rule categories for each row
+    df = classify_observations(df)
+
+    # Save the modified DataFrame to a new CSV file for each station
+    save_to_csv(df, station_code)
+
+    # Downcast the visibility and drop the sky condition columns, which are not needed after classification
+    df['vsby'] = df['vsby'].astype(np.float32)
+    df = df.drop(columns=["skyc1", "skyc2", "skyc3", "skyl1", "skyl2", "skyl3"])
 
+    return df
 
 def combine_dataframes(station_dfs, station_codes):
-    # Add a 'Station' column to each DataFrame
-    for i, df in enumerate(station_dfs):
-        df['Station'] = station_codes[i]
+    if not station_dfs:
+        raise ValueError("No station data to combine")
+
+    # Find where each station's rows start and end in the combined DataFrame
+    lengths = [len(df) for df in station_dfs]
+    offsets = np.cumsum([0] + lengths)
+
+    combined_columns = {}
+    for column in station_dfs[0].columns:
+        if isinstance(station_dfs[0][column].dtype, pd.CategoricalDtype):
+            # Merge the categories and concatenate the integer codes of categorical columns
+            combined_columns[column] = union_categoricals([df[column] for df in station_dfs])
+            continue
 
-    # Concatenate the DataFrames into one big DataFrame
-    combined_df = pd.concat(station_dfs, ignore_index=True)
+        # Fill a pre-allocated array with each station's values
+        combined = np.empty(offsets[-1], dtype=np.result_type(*[df[column].dtype for df in station_dfs]))
+        for df, start, end in zip(station_dfs, offsets[:-1], offsets[1:]):
+            combined[start:end] = df[column].to_numpy()
+        combined_columns[column] = combined
+
+    # Add a 'Station' column identifying the station of each row
+    combined_columns['Station'] = np.repeat(np.array(station_codes, dtype=object), lengths)
+
+    # Build the combined DataFrame in one go
+    combined_df = pd.DataFrame(combined_columns)
 
     return combined_df
 
@@ -267,60 +402,59 @@ if __name__ == "__main__":
     start_date = pd.to_datetime("2017-01-01")
     end_date = pd.to_datetime("2022-12-31")
 
-    station_dfs = []
-
-    for station_code in station_codes:
-        try:
-            # Fetch data from the URL for each station
-            csv_data = fetch_data(station_code, start_date, end_date)
-
-            # Save the raw data to a CSV file
-            save_to_csv(parse_csv_to_dataframe(csv_data), station_code + '_raw')
-
-            # Parse CSV data into a Pandas DataFrame
-            df = parse_csv_to_dataframe(csv_data)
+    # Fetch data from the URL for all stations at once
+    station_csv_data = asyncio.run(fetch_all_data(station_codes, start_date, end_date))
 
-            # Convert 'vsby' column to numeric (in case it's not already)
-            df['vsby'] = pd.to_numeric(df['vsby'], errors='coerce')
+    station_dfs = []
+    processed_station_codes = []
 
-            # Find the ceiling for each row
-            df = find_ceiling(df)
+    # Process the stations in parallel, each in its own worker process
+    with ProcessPoolExecutor(initializer=init_station_worker) as executor:
+        station_futures = {}
+        for station_code, csv_data in zip(station_codes, station_csv_data):
+            # Skip the stations for which fetching the data failed
+            if isinstance(csv_data, Exception):
+                print(f"Error processing data for station {station_code}: {csv_data}")
+                continue
 
-            # Calculate aviation flight rule categories
-            df = calculate_flight_rules(df)
+            station_futures[station_code] = executor.submit(process_station, station_code, csv_data)
 
-            # Save the modified DataFrame to a new CSV file for each station
-            save_to_csv(df, station_code)
+        for station_code, future in station_futures.items():
+            try:
+                # Wait for the processed DataFrame of the station
+                df = future.result()
 
-            # Append the DataFrame to the list
-            station_dfs.append(df)
+                # Append the DataFrame to the list
+                station_dfs.append(df)
+                processed_station_codes.append(station_code)
 
-            # Display information about the station and the modified DataFrame
-            print(f"\nStation: {station_code}")
-            print(df.head())
+                # Display information about the station and the modified DataFrame
+                print(f"\nStation: {station_code}")
+                print(df.head())
 
-        except Exception as e:
-            print(f"Error processing data for station {station_code}: {e}")
+            except Exception as e:
+                print(f"Error processing data for station {station_code}: {e}")
 
     # Combine the DataFrames for all stations into one big DataFrame
-    combined_df = combine_dataframes(station_dfs, station_codes)
+    combined_df = combine_dataframes(station_dfs, processed_station_codes)
 
-    # Ensure 'valid' column is datetime type
-    combined_df['valid'] = pd.to_datetime(combined_df['valid'], errors='coerce')
+    print(combined_df)
 
-    # Create a new column 'month' to store the month information
-    combined_df['month'] = combined_df['valid'].dt.month
 
-    # Extract hour of the day from the 'valid' column
-    combined_df['hour'] = combined_df['valid'].dt.hour
+    # Sum the "length_obs" column for each station and all flight categories at once
+    category_counts = combined_df.groupby(['Station', 'rule'], observed=False)['length_obs'].sum().unstack('rule')
 
-    print(combined_df)
+    # Sum the "length_obs" column to get the total number of hours for each station
+    total_hours = combined_df.groupby('Station')['length_obs'].sum()
 
+    climatology_period = f'{combined_df["valid"].dt.year.min()} - {combined_df["valid"].dt.year.max()}'
 
-    # Plot and save the total number of occurrences of "True" in the flight categories for each station
-    flight_categories = ['VFR', 'MVFR', 'IFR', 'LIFR']
-    for category_name in flight_categories:
-       plot_flight_category_occurrences(combined_df, category_name)
+    # Plot and save the average number of hours per year in each flight category for each station
+    # Reuse a single figure with larger size and higher DPI for all categories
+    fig, ax = plt.subplots(figsize=(16, 8), dpi=200)
+    for category_name in FLIGHT_RULE_DTYPE.categories:
+       plot_flight_category_occurrences(category_counts, total_hours, category_name, climatology_period, ax)
+    plt.close(fig)
 
     # Plot the frequency of sub-VFR conditions by hour and month for each station
     plot_subvfr_frequency_by_hour(combined_df)